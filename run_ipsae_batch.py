@@ -4,14 +4,31 @@ Batch runner for ipsae.py on Boltz output structures.
 Collates results into separate CSV files for A→B, B→A, and max interaction types.
 """
 
+import contextlib
+import importlib.machinery
+import io
+import logging
 import os
+import re
 import sys
-import subprocess
 import pandas as pd
-import glob
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 import argparse
 
+try:
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa_csv = None
+
+logger = logging.getLogger("batch_ipsae")
+
+# Whitespace patterns used to turn ipsae.py's space-padded table into TSV
+_EDGE_WHITESPACE = re.compile(r"^[ \t]+|[ \t]+$", re.MULTILINE)
+_FIELD_WHITESPACE = re.compile(r"[ \t]+")
+
 def find_boltz_structures(out_dir):
     """
     Find all PAE and CIF file pairs in the Boltz output directory.
@@ -20,147 +37,314 @@ def find_boltz_structures(out_dir):
         out_dir (str): Path to Boltz output directory
         
     Returns:
-        list: List of tuples containing (pae_file, cif_file, input_name)
+        list: List of tuples containing (pae_file, cif_file, input_name), with
+            pae_file and cif_file as Path objects
     """
     predictions_dir = os.path.join(out_dir, "predictions")
     
     if not os.path.exists(predictions_dir):
-        print(f"Error: Predictions directory not found at {predictions_dir}")
+        logger.error("Error: Predictions directory not found at %s", predictions_dir)
         return []
     
     structure_pairs = []
     
     # Iterate through each input folder in predictions
-    for input_folder in os.listdir(predictions_dir):
-        input_path = os.path.join(predictions_dir, input_folder)
-        
-        if not os.path.isdir(input_path):
-            continue
+    with os.scandir(predictions_dir) as folders:
+        for folder in folders:
+            if not folder.is_dir():
+                continue
             
-        print(f"Processing folder: {input_folder}")
-        
-        # Find all PAE files in this folder
-        pae_files = glob.glob(os.path.join(input_path, f"pae_{input_folder}_model_*.npz"))
-        
-        for pae_file in pae_files:
-            # Extract model number from PAE filename
-            pae_basename = os.path.basename(pae_file)
-            model_part = pae_basename.replace(f"pae_{input_folder}_", "").replace(".npz", "")
+            input_folder = folder.name
+            logger.debug("Processing folder: %s", input_folder)
             
-            # Find corresponding CIF file
-            cif_file = os.path.join(input_path, f"{input_folder}_{model_part}.cif")
+            # Filename prefixes are fixed per folder, so build them once
+            pae_prefix = f"pae_{input_folder}_"
+            pae_model_prefix = f"{pae_prefix}model_"
+            cif_prefix = f"{input_folder}_"
             
-            if os.path.exists(cif_file):
-                structure_pairs.append((pae_file, cif_file, input_folder))
-                print(f"  Found pair: {os.path.basename(pae_file)} + {os.path.basename(cif_file)}")
-            else:
-                print(f"  Warning: CIF file not found for {pae_basename}")
+            # Classify PAE and CIF files in a single directory pass, keeping the
+            # CIF stems in a set so pairing needs no per-file existence checks
+            folder_path = Path(folder.path)
+            pae_by_model = {}
+            cif_stems = set()
+            with os.scandir(folder.path) as files:
+                for entry in files:
+                    name = entry.name
+                    if name.startswith(pae_model_prefix) and name.endswith(".npz"):
+                        pae_by_model[name[len(pae_prefix):-4]] = folder_path / name
+                    elif name.endswith(".cif"):
+                        cif_stems.add(name[:-4])
+            
+            # Pair each PAE file with the CIF file for the same model
+            for model_part, pae_file in pae_by_model.items():
+                cif_stem = f"{cif_prefix}{model_part}"
+                
+                if cif_stem in cif_stems:
+                    cif_file = folder_path / f"{cif_stem}.cif"
+                    structure_pairs.append((pae_file, cif_file, input_folder))
+                    logger.debug("  Found pair: %s + %s", pae_file.name, cif_file.name)
+                else:
+                    logger.warning("  Warning: CIF file not found for %s", pae_file.name)
     
     return structure_pairs
 
+# Compiled ipsae.py code, loaded once per worker process by init_worker()
+_ipsae_code = None
+
+def init_worker(ipsae_script_path, log_level=logging.INFO):
+    """
+    Load and compile ipsae.py once in a worker process.
+    
+    Running the compiled code in-process avoids starting a new Python
+    interpreter (and re-importing numpy) for every structure.
+    
+    Args:
+        ipsae_script_path (str): Path to ipsae.py script
+        log_level (int): Logging level for messages from this process
+    """
+    global _ipsae_code
+    logging.basicConfig(stream=sys.stdout, format="%(message)s")
+    logger.setLevel(log_level)
+    
+    abs_ipsae_path = os.path.abspath(ipsae_script_path)
+    loader = importlib.machinery.SourceFileLoader("ipsae", abs_ipsae_path)
+    _ipsae_code = loader.get_code("ipsae")
+    
+    # Match `python ipsae.py`, which puts the script's directory on sys.path
+    sys.path.insert(0, os.path.dirname(abs_ipsae_path))
+
+def parse_ipsae_table(text):
+    """
+    Parse an ipsae.py results table into column names and row tuples.
+    
+    Uses pyarrow's CSV reader when pyarrow is installed, and falls back to
+    pandas otherwise. Rows are returned as plain tuples, which are cheaper
+    to pass between processes than a pickled DataFrame.
+    
+    Args:
+        text (str): Contents of the ipsae.py results .txt file
+        
+    Returns:
+        tuple: (columns, rows) with rows as a list of tuples
+    """
+    if pa_csv is None:
+        df = pd.read_csv(io.StringIO(text), sep=r"\s+", engine="c")
+        return list(df.columns), list(df.itertuples(index=False, name=None))
+    
+    # pyarrow needs a single-character delimiter, but ipsae.py pads its
+    # columns with runs of spaces
+    text = _FIELD_WHITESPACE.sub("\t", _EDGE_WHITESPACE.sub("", text))
+    
+    # Worker processes already run in parallel, so keep each parse single-threaded
+    table = pa_csv.read_csv(
+        io.BytesIO(text.encode()),
+        read_options=pa_csv.ReadOptions(use_threads=False),
+        parse_options=pa_csv.ParseOptions(delimiter="\t"),
+    )
+    return table.column_names, list(zip(*(column.to_pylist() for column in table.columns)))
+
+class _CapturedTable(io.StringIO):
+    """In-memory stand-in for the results .txt file written by ipsae.py."""
+    
+    def close(self):
+        # Keep the contents readable after ipsae.py closes the file
+        pass
+
 def run_ipsae(ipsae_script_path, pae_file, cif_file, pae_cutoff, dist_cutoff):
     """
-    Run ipsae.py on a single structure pair.
+    Run ipsae.py on a single structure pair and return its results table.
+    
+    The results table that ipsae.py would write to a .txt file is captured in
+    memory and parsed directly; its other outputs are still written next to
+    the input files. Must be called in a process set up by init_worker().
     
     Args:
         ipsae_script_path (str): Path to ipsae.py script
-        pae_file (str): Path to PAE NPZ file
-        cif_file (str): Path to CIF file
+        pae_file (Path): Path to PAE NPZ file
+        cif_file (Path): Path to CIF file
         pae_cutoff (float): PAE cutoff value
         dist_cutoff (float): Distance cutoff value
         
     Returns:
-        str or None: Path to the generated .txt file, or None if failed
+        tuple or None: (columns, rows) of the parsed results table, with rows
+            as a list of tuples, or None if failed
     """
+    original_argv = sys.argv
+    original_cwd = os.getcwd()
+    errors = io.StringIO()
+    tables = []
+    
+    def capture_open(file, mode="r", *args, **kwargs):
+        name = os.fspath(file) if isinstance(file, (str, os.PathLike)) else ""
+        if "w" in mode and name.endswith(".txt") and not name.endswith("_byres.txt"):
+            table = _CapturedTable()
+            tables.append(table)
+            return table
+        return open(file, mode, *args, **kwargs)
+    
     try:
-        # Get the directory containing the input files
-        input_dir = os.path.dirname(cif_file)
-        
-        # Convert ipsae script path to absolute path BEFORE changing directories
         abs_ipsae_path = os.path.abspath(ipsae_script_path)
         
-        # Change to the input directory before running ipsae.py
+        # Run ipsae.py from the input directory with relative paths for input files
         # This ensures output files are created in the same location as input files
-        original_cwd = os.getcwd()
+        input_dir = cif_file.parent
+        pae_basename = pae_file.name
+        cif_basename = cif_file.name
+        
+        logger.debug("Running: ipsae.py %s %s %s %s", pae_basename, cif_basename, pae_cutoff, dist_cutoff)
+        
+        # Each worker process runs one structure at a time, so it is safe to
+        # change the working directory and sys.argv for the duration of the run
         os.chdir(input_dir)
+        sys.argv = [abs_ipsae_path, pae_basename, cif_basename, str(pae_cutoff), str(dist_cutoff)]
         
+        # Only keep ipsae.py's console output when it will be shown; otherwise
+        # send it straight to /dev/null instead of buffering it in memory
+        if logger.isEnabledFor(logging.DEBUG):
+            stdout_sink = contextlib.nullcontext(io.StringIO())
+        else:
+            stdout_sink = open(os.devnull, "w")
+        
+        # Functions defined by ipsae.py refer back to this namespace, so it is
+        # cleared after the run to free its arrays without waiting for the GC
+        namespace = {"__name__": "__main__", "__file__": abs_ipsae_path, "open": capture_open}
         try:
-            # Run ipsae.py with relative paths for input files
-            pae_basename = os.path.basename(pae_file)
-            cif_basename = os.path.basename(cif_file)
-            
-            cmd = [
-                "python", abs_ipsae_path,
-                pae_basename, cif_basename,
-                str(pae_cutoff), str(dist_cutoff)
-            ]
-            
-            print(f"Running: {' '.join(cmd)}")
-            print(f"Working directory: {input_dir}")
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            
-            # Determine the expected output .txt file name
-            cif_name_no_ext = os.path.splitext(cif_basename)[0]
-            
-            # Handle float cutoffs that might have decimal points
-            pae_str = str(pae_cutoff).rstrip('0').rstrip('.') if '.' in str(pae_cutoff) else str(int(pae_cutoff))
-            dist_str = str(dist_cutoff).rstrip('0').rstrip('.') if '.' in str(dist_cutoff) else str(int(dist_cutoff))
-            
-            output_txt = f"{cif_name_no_ext}_{pae_str}_{dist_str}.txt"
-            
-            # Check if the file was created in the current directory (input_dir)
-            if os.path.exists(output_txt):
-                full_path = os.path.join(input_dir, output_txt)
-                return full_path
-            else:
-                # List all .txt files in the directory to debug
-                txt_files = [f for f in os.listdir('.') if f.endswith('.txt')]
-                print(f"Expected: {output_txt}")
-                print(f"Found .txt files: {txt_files}")
-                
-                # Try to find any .txt file that contains the model name
-                model_name = cif_name_no_ext.split('_model_')[0] if '_model_' in cif_name_no_ext else cif_name_no_ext
-                potential_files = [f for f in txt_files if model_name in f and not f.endswith('_byres.txt')]
-                
-                if potential_files:
-                    # Use the first matching file
-                    found_file = potential_files[0]
-                    print(f"Using alternative file: {found_file}")
-                    return os.path.join(input_dir, found_file)
-                else:
-                    print(f"Warning: No suitable .txt output file found")
-                    return None
-            
-        finally:
-            # Always return to original directory
-            os.chdir(original_cwd)
-            
-    except subprocess.CalledProcessError as e:
-        print(f"Error running ipsae.py: {e}")
-        print(f"stdout: {e.stdout}")
-        print(f"stderr: {e.stderr}")
-        return None
+            with stdout_sink as stdout, contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(errors):
+                try:
+                    exec(_ipsae_code, namespace)
+                finally:
+                    namespace.clear()
+                    if isinstance(stdout, io.StringIO):
+                        logger.debug("ipsae.py output for %s:\n%s", cif_basename, stdout.getvalue())
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                raise RuntimeError(f"ipsae.py exited with status {e.code}")
+        
+        if not tables:
+            logger.warning("Warning: ipsae.py did not write a results table for %s", cif_basename)
+            return None
+        
+        return parse_ipsae_table(tables[0].getvalue())
+        
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        logger.error("Error running ipsae.py on %s: %s", cif_file.name, e)
+        logger.error("stderr: %s", errors.getvalue())
         return None
+    finally:
+        sys.argv = original_argv
+        os.chdir(original_cwd)
 
-def parse_ipsae_output(txt_file):
+def process_structures(structure_pairs, ipsae_script_path, pae_cutoff, dist_cutoff, jobs, log_level):
     """
-    Parse the ipsae output .txt file.
+    Run ipsae.py on every structure pair in a pool of worker processes.
+    
+    Structures are submitted largest CIF first, with at most `jobs` of them
+    in flight at a time. If ipsae.py kills its worker process outright
+    (e.g. a segfault or OOM kill), the pool is rebuilt and the structures
+    that were running at the time are retried one at a time, so only the
+    structure that actually kills its worker is lost.
     
     Args:
-        txt_file (str): Path to the .txt file
+        structure_pairs (list): Tuples of (pae_file, cif_file, input_name)
+        ipsae_script_path (str): Path to ipsae.py script
+        pae_cutoff (float): PAE cutoff value
+        dist_cutoff (float): Distance cutoff value
+        jobs (int): Number of worker processes
+        log_level (int): Logging level for the worker processes
         
     Returns:
-        pd.DataFrame or None: Parsed data as DataFrame, or None if failed
+        list: The (columns, rows) result for each structure pair, in the same
+            order as structure_pairs, with None for structures that failed
+    """
+    # Results are stored by position in structure_pairs, so the output keeps
+    # scan order whatever order the runs finish in
+    results = [None] * len(structure_pairs)
+    finished_count = 0
+    
+    def record(index, result):
+        nonlocal finished_count
+        finished_count += 1
+        cif_file = structure_pairs[index][1]
+        logger.info("Finished %d/%d: %s", finished_count, len(structure_pairs), cif_file.name)
+        
+        if result is not None and result[1]:
+            results[index] = result
+            logger.debug("  Successfully processed: %d rows", len(result[1]))
+        else:
+            logger.warning("  Failed to process %s", cif_file.name)
+    
+    def run_pool(indices, max_workers):
+        # Returns the structures that were in flight and those not yet submitted
+        # if the pool breaks, or two empty lists once every structure is done
+        pending = deque(indices)
+        in_flight = {}
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                                 initargs=(ipsae_script_path, log_level)) as executor:
+            while pending or in_flight:
+                # Only submit as many structures as there are workers, so that a
+                # broken pool can be traced back to a handful of structures
+                while pending and len(in_flight) < max_workers:
+                    index = pending.popleft()
+                    pae_file, cif_file, _ = structure_pairs[index]
+                    try:
+                        future = executor.submit(run_ipsae, ipsae_script_path, pae_file, cif_file,
+                                                 pae_cutoff, dist_cutoff)
+                    except BrokenProcessPool:
+                        # A worker died after the last wait() returned
+                        return [index, *in_flight.values()], list(pending)
+                    in_flight[future] = index
+                
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        return [index, *in_flight.values()], list(pending)
+                    record(index, result)
+        return [], []
+    
+    # Submit the largest CIF first. Starting the longest ipsae.py runs early
+    # keeps a large structure from finishing alone at the end of the batch
+    # while the other workers sit idle.
+    remaining = sorted(range(len(structure_pairs)),
+                       key=lambda index: structure_pairs[index][1].stat().st_size,
+                       reverse=True)
+    
+    while remaining:
+        suspects, remaining = run_pool(remaining, jobs)
+        if suspects:
+            logger.warning("A worker process died; retrying %d interrupted structures one at a time",
+                           len(suspects))
+        
+        # Run each interrupted structure in a worker of its own, so that only
+        # the one that kills its worker is given up on
+        for index in suspects:
+            lost, _ = run_pool([index], 1)
+            if lost:
+                logger.error("Error running ipsae.py on %s: worker process died",
+                             structure_pairs[index][1].name)
+                record(index, None)
+    
+    return results
+
+def positive_int(value):
+    """
+    Parse a command line value as an integer of at least 1.
+    
+    Args:
+        value (str): Raw argument value
+        
+    Returns:
+        int: The parsed value
     """
     try:
-        # Read the file, assuming it's tab or space delimited
-        df = pd.read_csv(txt_file, delim_whitespace=True)
-        return df
-    except Exception as e:
-        print(f"Error parsing {txt_file}: {e}")
-        return None
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
 
 def main():
     parser = argparse.ArgumentParser(description="Batch run ipsae.py on Boltz output structures")
@@ -169,67 +353,101 @@ def main():
     parser.add_argument("--pae_cutoff", type=float, default=15.0, help="PAE cutoff value (default: 15)")
     parser.add_argument("--dist_cutoff", type=float, default=15.0, help="Distance cutoff value (default: 15)")
     parser.add_argument("--output_prefix", default="ipsae_results", help="Prefix for output CSV files")
+    parser.add_argument("--jobs", type=positive_int, default=os.cpu_count() or 1, help="Number of structures to process in parallel (default: CPU count)")
+    
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", action="store_true", help="Show per-file progress messages")
+    verbosity.add_argument("-q", "--quiet", action="store_true", help="Only show warnings and errors")
     
     args = parser.parse_args()
     
+    if args.verbose:
+        log_level = logging.DEBUG
+    elif args.quiet:
+        log_level = logging.WARNING
+    else:
+        log_level = logging.INFO
+    logging.basicConfig(stream=sys.stdout, format="%(message)s")
+    logger.setLevel(log_level)
+    
     # Validate inputs
     if not os.path.exists(args.out_dir):
-        print(f"Error: Output directory not found: {args.out_dir}")
+        logger.error("Error: Output directory not found: %s", args.out_dir)
         sys.exit(1)
         
     if not os.path.exists(args.ipsae_script):
-        print(f"Error: ipsae.py script not found: {args.ipsae_script}")
+        logger.error("Error: ipsae.py script not found: %s", args.ipsae_script)
+        sys.exit(1)
+    
+    # Load ipsae.py up front so that a broken script fails before any work starts
+    try:
+        init_worker(args.ipsae_script, log_level)
+    except (SyntaxError, OSError) as e:
+        logger.error("Error: could not load ipsae.py script: %s", e)
         sys.exit(1)
     
     # Find all structure pairs
-    print("Finding Boltz structure pairs...")
+    logger.info("Finding Boltz structure pairs...")
     structure_pairs = find_boltz_structures(args.out_dir)
     
     if not structure_pairs:
-        print("No structure pairs found!")
+        logger.error("No structure pairs found!")
         sys.exit(1)
     
-    print(f"Found {len(structure_pairs)} structure pairs to process")
+    logger.info("Found %d structure pairs to process", len(structure_pairs))
+    
+    # Process structure pairs concurrently. Each worker process loads
+    # ipsae.py once and then runs it in-process for every structure.
+    results = process_structures(structure_pairs, args.ipsae_script, args.pae_cutoff,
+                                 args.dist_cutoff, args.jobs, log_level)
+    
+    # Collect result rows as plain tuples and build one DataFrame at the end,
+    # rather than keeping every per-structure DataFrame around for pd.concat
+    rows = []
     
-    # Initialize lists to collect results
-    all_results = []
+    # Like pd.concat, take the union of all result columns in order of first appearance
+    ipsae_columns = list(dict.fromkeys(
+        column for result in results if result is not None for column in result[0]
+    ))
     
-    # Process each structure pair
-    for i, (pae_file, cif_file, input_name) in enumerate(structure_pairs, 1):
-        print(f"\n=== Processing {i}/{len(structure_pairs)}: {input_name} ===")
+    # Metadata is kept once per structure, with each row recording the index
+    # of its structure, instead of repeating the same strings in every row
+    structure_metadata = []
+    row_structures = []
+    
+    for (pae_file, cif_file, input_name), result in zip(structure_pairs, results):
+        if result is None:
+            continue
         
-        # Run ipsae.py
-        output_txt = run_ipsae(args.ipsae_script, pae_file, cif_file, 
-                              args.pae_cutoff, args.dist_cutoff)
+        result_columns, result_rows = result
         
-        if output_txt:
-            # Parse the results
-            df = parse_ipsae_output(output_txt)
-            
-            if df is not None and not df.empty:
-                # Add metadata columns
-                df['input_name'] = input_name
-                df['pae_file'] = os.path.basename(pae_file)
-                df['cif_file'] = os.path.basename(cif_file)
-                
-                all_results.append(df)
-                print(f"  Successfully processed: {len(df)} rows")
-                
-                # Clean up the temporary output file if it's in current directory
-                if os.path.exists(output_txt) and os.path.dirname(output_txt) == "":
-                    try:
-                        os.remove(output_txt)
-                    except:
-                        pass
-            else:
-                print(f"  Failed to parse results from {output_txt}")
-        else:
-            print(f"  Failed to generate ipsae output")
+        # Realign structures that lack some columns, filling the gaps with NaN
+        if result_columns != ipsae_columns:
+            result_rows = list(pd.DataFrame.from_records(result_rows, columns=result_columns)
+                               .reindex(columns=ipsae_columns)
+                               .itertuples(index=False, name=None))
+        
+        row_structures.extend([len(structure_metadata)] * len(result_rows))
+        structure_metadata.append((input_name, pae_file.name, cif_file.name))
+        rows.extend(result_rows)
+    del results
     
     # Combine all results
-    if all_results:
-        combined_df = pd.concat(all_results, ignore_index=True)
-        print(f"\nCombined {len(combined_df)} total rows from {len(all_results)} structures")
+    if rows:
+        combined_df = pd.DataFrame.from_records(rows, columns=ipsae_columns)
+        del rows
+        
+        # Add metadata columns as categoricals expanded from the per-structure values
+        metadata_df = pd.DataFrame.from_records(
+            structure_metadata, columns=['input_name', 'pae_file', 'cif_file']
+        ).astype('category')
+        for col in metadata_df.columns:
+            combined_df[col] = metadata_df[col].take(row_structures).array
+        
+        # Store the remaining low-cardinality text columns as categoricals
+        cat_cols = [col for col in ['Type', 'Chn1', 'Chn2'] if col in combined_df.columns]
+        combined_df[cat_cols] = combined_df[cat_cols].astype('category')
+        logger.info("Combined %d total rows from %d structures", len(combined_df), len(structure_metadata))
         
         # Separate by interaction type and save to CSV
         interaction_types = ['asym', 'max']  # Based on your example, looks like A->B and B->A are both 'asym'
@@ -237,40 +455,35 @@ def main():
         # Check what Type values actually exist
         if 'Type' in combined_df.columns:
             actual_types = combined_df['Type'].unique()
-            print(f"Found interaction types: {list(actual_types)}")
+            logger.info("Found interaction types: %s", list(actual_types))
             
-            # Save separate CSV for each type
-            for interaction_type in actual_types:
-                type_df = combined_df[combined_df['Type'] == interaction_type].copy()
-                
-                if not type_df.empty:
-                    output_file = f"{args.output_prefix}_{interaction_type}.csv"
-                    type_df.to_csv(output_file, index=False)
-                    print(f"Saved {len(type_df)} rows to {output_file}")
+            # Save separate CSV for each type, partitioning the rows in one pass
+            for interaction_type, type_df in combined_df.groupby('Type', sort=False, observed=True):
+                output_file = f"{args.output_prefix}_{interaction_type}.csv"
+                type_df.to_csv(output_file, index=False)
+                logger.info("Saved %d rows to %s", len(type_df), output_file)
             
             # Also save A->B and B->A separately if we have Chn1 and Chn2 columns
             if 'Chn1' in combined_df.columns and 'Chn2' in combined_df.columns:
-                # A->B interactions
-                ab_df = combined_df[(combined_df['Chn1'] == 'A') & (combined_df['Chn2'] == 'B')].copy()
-                if not ab_df.empty:
-                    ab_file = f"{args.output_prefix}_A_to_B.csv"
-                    ab_df.to_csv(ab_file, index=False)
-                    print(f"Saved {len(ab_df)} A→B interactions to {ab_file}")
-                
-                # B->A interactions
-                ba_df = combined_df[(combined_df['Chn1'] == 'B') & (combined_df['Chn2'] == 'A')].copy()
-                if not ba_df.empty:
-                    ba_file = f"{args.output_prefix}_B_to_A.csv"
-                    ba_df.to_csv(ba_file, index=False)
-                    print(f"Saved {len(ba_df)} B→A interactions to {ba_file}")
+                chain_outputs = {
+                    ('A', 'B'): ("A_to_B", "A→B"),
+                    ('B', 'A'): ("B_to_A", "B→A"),
+                }
+                for chain_pair, chain_df in combined_df.groupby(['Chn1', 'Chn2'], sort=False, observed=True):
+                    if chain_pair not in chain_outputs:
+                        continue
+                    suffix, label = chain_outputs[chain_pair]
+                    chain_file = f"{args.output_prefix}_{suffix}.csv"
+                    chain_df.to_csv(chain_file, index=False)
+                    logger.info("Saved %d %s interactions to %s", len(chain_df), label, chain_file)
         
         # Save complete results
         complete_file = f"{args.output_prefix}_complete.csv"
         combined_df.to_csv(complete_file, index=False)
-        print(f"Saved complete results ({len(combined_df)} rows) to {complete_file}")
+        logger.info("Saved complete results (%d rows) to %s", len(combined_df), complete_file)
         
     else:
-        print("No results to save!")
+        logger.warning("No results to save!")
 
 if __name__ == "__main__":
     main()